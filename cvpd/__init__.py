@@ -1,18 +1,31 @@
-from cvpd.core import factory
+from cvpd.core import factory, DetectorPool
+from cvpd.scheduler import LatencyScheduler, ScheduledEstimate, Strategy
 
-from cvpd.detector.detector_abc import DetectorABC
+from cvpd.detector.detector_abc import DetectorABC, PoseEstimate
 from cvpd.detector.detector_charuco import CharucoDetector
 from cvpd.detector.detector_aruco_marker import ArucoMarkerDetector
 from cvpd.detector.detector_aruco_pattern import ArucoPatternDetector
+from cvpd.detector.detector_multi_camera import CameraSetup, MultiCameraDetector
 
 
 __all__ = [
     # Factory
     "factory",
-    
+    "DetectorPool",
+
     # Detector classes
     "DetectorABC",
     "CharucoDetector",
     "ArucoMarkerDetector",
     "ArucoPatternDetector",
+    "MultiCameraDetector",
+
+    # Scheduling
+    "LatencyScheduler",
+    "ScheduledEstimate",
+    "Strategy",
+
+    # Data types
+    "PoseEstimate",
+    "CameraSetup",
 ]
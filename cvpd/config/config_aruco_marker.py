@@ -4,6 +4,7 @@ import cv2 as cv
 
 # local
 from cvpd.config.config import Configurable
+from cvpd.config.config_offset import Offset
 from cvpd.config._aruco_types import ARUCO_DICT
 
 # typing
@@ -14,16 +15,44 @@ class ArucoMarker(Configurable):
 
     def __init__(self, **kwargs: Any):
         super().__init__()
-        self.marker_id: int = kwargs['marker_id']
         self.marker_size: int = kwargs['marker_size']
         self.marker_type: str = kwargs['marker_type']
+        # Optional multi-id mode. Per-id sizes and offsets are also used for the single marker
+        raw_marker_ids = kwargs.get('marker_ids')
+        self.multi_id = raw_marker_ids is not None
+        if raw_marker_ids is None:
+            self.marker_id: int = kwargs['marker_id']
+            self.marker_ids: list[int] = [self.marker_id]
+        else:
+            self.marker_ids = [int(m_id) for m_id in raw_marker_ids]
+            if len(self.marker_ids) == 0 or len(set(self.marker_ids)) != len(self.marker_ids):
+                raise ValueError(f"Marker ids have to be a non-empty list of unique ids. Got {self.marker_ids}")
+            self.marker_id = int(kwargs.get('marker_id', self.marker_ids[0]))
+            if self.marker_id not in self.marker_ids:
+                raise ValueError(f"Marker id '{self.marker_id}' is not part of the marker ids {self.marker_ids}")
+        self.marker_sizes: dict[int, int] = {}
+        for k, v in kwargs.get('marker_sizes', {}).items():
+            self.marker_sizes[int(k)] = v
+        self.marker_offsets: dict[int, Offset] = {}
+        for k, v in kwargs.get('marker_offsets', {}).items():
+            self.marker_offsets[int(k)] = Offset(offset=v)
 
     def to_dict(self) -> dict[str, Any]:
-        return {
+        cfg_dict: dict[str, Any] = {
             'marker_id': self.marker_id,
             'marker_size': self.marker_size,
             'marker_type': self.marker_type,
         }
+        if self.multi_id:
+            cfg_dict['marker_ids'] = self.marker_ids
+        if self.marker_sizes:
+            cfg_dict['marker_sizes'] = self.marker_sizes
+        if self.marker_offsets:
+            cfg_dict['marker_offsets'] = {k: v.to_dict()['offset'] for k, v in self.marker_offsets.items()}
+        return cfg_dict
+
+    def get_marker_size(self, marker_id: int) -> int:
+        return self.marker_sizes.get(marker_id, self.marker_size)
 
     @property
     def cv_aruco_dict(self) -> cv.aruco.Dictionary:
@@ -22,13 +22,17 @@ class ArucoPattern(Configurable):
         for k, v in raw_marker_layout.items():
             assert len(v) == 2
             self.marker_layout[int(k)] = [float(_v) for _v in v]
+        self.multi_instance = bool(kwargs.get('multi_instance', False))
 
     def to_dict(self) -> dict[str, Any]:
-        return {
+        cfg_dict: dict[str, Any] = {
             'marker_size': self.marker_size,
             'marker_type': self.marker_type,
             'marker_layout': self.marker_layout,
         }
+        if self.multi_instance:
+            cfg_dict['multi_instance'] = self.multi_instance
+        return cfg_dict
 
     @property
     def marker_ids(self) -> set[int]:
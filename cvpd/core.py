@@ -1,16 +1,22 @@
 from __future__ import annotations
 
 # global
+import os
+import queue
+import numpy as np
 from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # local
-from cvpd.detector.detector_abc import DetectorABC
+from cvpd.detector.detector_abc import DetectorABC, PoseEstimate
 from cvpd.detector.detector_charuco import CharucoDetector
 from cvpd.detector.detector_aruco_marker import ArucoMarkerDetector
 from cvpd.detector.detector_aruco_pattern import ArucoPatternDetector
 
 # typing
-from typing import Type
+from typing import Iterable, Iterator, Type
+from numpy import typing as npt
 
 
 class DetectorFactory:
@@ -34,3 +40,90 @@ factory = DetectorFactory()
 factory.register('charuco', CharucoDetector)
 factory.register('aruco_marker', ArucoMarkerDetector)
 factory.register('aruco_pattern', ArucoPatternDetector)
+
+
+class DetectorPool:
+
+    def __init__(self, config_file: str | Path, n_workers: int | None = None):
+        """ Pool of detector workers built from one configuration for concurrent frame processing
+
+        Args:
+            config_file: Detector configuration file
+            n_workers:   Number of detector workers and threads. Default is the number of CPUs
+        """
+        n_workers = n_workers if n_workers is not None else (os.cpu_count() or 1)
+        if n_workers < 1:
+            raise ValueError(f"Number of workers has to be positive. Got {n_workers}")
+        self.detector = factory.create(config_file)
+        self._idle: queue.Queue[DetectorABC] = queue.Queue()
+        for _ in range(n_workers):
+            self._idle.put(self.detector.spawn())
+        self._executor = ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix='cvpd')
+
+    def __enter__(self) -> DetectorPool:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.shutdown()
+
+    @contextmanager
+    def acquire(self, timeout: float | None = None) -> Iterator[DetectorABC]:
+        """ Borrow a detector worker for exclusive use in the calling thread
+
+        Args:
+            timeout: Time in seconds to wait for an idle worker. Default is to wait forever
+
+        Returns:
+            Detector worker
+        """
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No idle detector worker available after {timeout} seconds")
+        try:
+            yield worker
+        finally:
+            self._idle.put(worker)
+
+    def _estimate_pose(self,
+                       img: npt.NDArray[np.uint8],
+                       intrinsic: npt.NDArray[np.float64],
+                       distortion: npt.NDArray[np.float64]) -> PoseEstimate:
+        with self.acquire() as worker:
+            return worker.estimate_pose(img, intrinsic, distortion)
+
+    def submit(self,
+               img: npt.NDArray[np.uint8],
+               intrinsic: npt.NDArray[np.float64],
+               distortion: npt.NDArray[np.float64]) -> Future[PoseEstimate]:
+        """ Schedule a pose estimation of a single frame
+
+        Args:
+            img:        RGB image
+            intrinsic:  Camera matrix
+            distortion: Distortion coefficients
+
+        Returns:
+            Future of the pose estimate
+        """
+        return self._executor.submit(self._estimate_pose, img, intrinsic, distortion)
+
+    def map(self,
+            imgs: Iterable[npt.NDArray[np.uint8]],
+            intrinsic: npt.NDArray[np.float64],
+            distortion: npt.NDArray[np.float64]) -> list[PoseEstimate]:
+        """ Estimate the poses of several frames concurrently
+
+        Args:
+            imgs:       RGB images
+            intrinsic:  Camera matrix
+            distortion: Distortion coefficients
+
+        Returns:
+            Pose estimates in the order of the given images
+        """
+        futures = [self.submit(img, intrinsic, distortion) for img in imgs]
+        return [f.result() for f in futures]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
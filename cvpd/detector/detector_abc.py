@@ -2,6 +2,9 @@ from __future__ import annotations
 
 # global
 import abc
+import copy
+import cv2 as cv
+import numpy as np
 import spatialmath as sm
 from pathlib import Path
 from camera_kit import DetectorBase
@@ -12,6 +15,19 @@ from cvpd.config.config import Configuration
 from cvpd.config.config_offset import Offset
 from cvpd.config.config_preproc import Preprocessing
 
+# typing
+from typing import NamedTuple
+from numpy import typing as npt
+
+
+class PoseEstimate(NamedTuple):
+    """ Result of a single pose estimation including quality measures """
+    found: bool
+    mat: sm.SE3
+    reproj_err: float = float('inf')  # RMS reprojection error in pixel
+    n_markers: int = 0                # Number of markers used for the estimate
+    img_pts: npt.NDArray[np.float64] | None = None  # Image points used for the estimate. Shape (N, 2)
+
 
 class DetectorABC(DetectorBase, metaclass=abc.ABCMeta):
 
@@ -23,13 +39,103 @@ class DetectorABC(DetectorBase, metaclass=abc.ABCMeta):
         self.config_offset = Offset(**self.config_dict)
         self.config = Configuration(self.config_preproc, self.config_offset)
 
-    @abc.abstractmethod
+    def spawn(self) -> DetectorABC:
+        """ Create a detector worker sharing the immutable compiled state with this detector.
+            Workers can estimate poses concurrently as long as each worker is used by one thread at a time.
+
+        Returns:
+            New detector worker
+        """
+        worker = copy.copy(self)
+        worker._init_worker_state()
+        return worker
+
+    def _init_worker_state(self) -> None:
+        """ Create the mutable state owned by a single detector worker. Overwrite in subclass if needed """
+        pass
+
     def _find_pose(self) -> tuple[bool, sm.SE3]:
-        """ Abstract class method to get the object pose estimate
+        """ Class method to get the object pose estimate
 
         Returns:
             (True if pose was found; Pose as SE(3) transformation matrix)
         """
+        estimate = self.estimate_pose()
+        return estimate.found, estimate.mat
+
+    def estimate_pose(self,
+                      img: npt.NDArray[np.uint8] | None = None,
+                      intrinsic: npt.NDArray[np.float64] | None = None,
+                      distortion: npt.NDArray[np.float64] | None = None,
+                      refine: bool = True) -> PoseEstimate:
+        """ Estimate the object pose. Missing arguments are taken from the registered camera.
+            The method does not modify the detector if all arguments are given.
+
+        Args:
+            img:        RGB image. Default is the current frame of the registered camera
+            intrinsic:  Camera matrix. Default is the matrix of the registered camera
+            distortion: Distortion coefficients. Default are the coefficients of the registered camera
+            refine:     Flag whether the pose is refined by a non-linear optimization
+
+        Returns:
+            Pose estimate with reprojection error and number of used markers
+        """
+        return self._estimate_pose(*self._resolve_input(img, intrinsic, distortion), refine=refine)
+
+    def _resolve_input(self,
+                       img: npt.NDArray[np.uint8] | None,
+                       intrinsic: npt.NDArray[np.float64] | None,
+                       distortion: npt.NDArray[np.float64] | None
+                       ) -> tuple[npt.NDArray[np.uint8], npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        """ Fill missing estimation inputs from the registered camera and preprocess the image
+
+        Args:
+            img:        RGB image or None
+            intrinsic:  Camera matrix or None
+            distortion: Distortion coefficients or None
+
+        Returns:
+            (Preprocessed image; Camera matrix; Distortion coefficients)
+        """
+        if img is None:
+            img = self.camera.get_color_frame()
+        if intrinsic is None:
+            intrinsic = self.camera.cc.intrinsic
+        if distortion is None:
+            distortion = self.camera.cc.distortion
+        return self._preprocess(img), intrinsic, distortion
+
+    def _preprocess(self, img: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+        """ Apply the configured preprocessing steps to an image
+
+        Args:
+            img: RGB image
+
+        Returns:
+            Preprocessed image
+        """
+        if self.config_preproc.invert_img:
+            img = cv.bitwise_not(img)
+        return img
+
+    @abc.abstractmethod
+    def _estimate_pose(self,
+                       img: npt.NDArray[np.uint8],
+                       intrinsic: npt.NDArray[np.float64],
+                       distortion: npt.NDArray[np.float64],
+                       refine: bool = True) -> PoseEstimate:
+        """ Abstract class method to estimate the object pose from a preprocessed image.
+            Implementations must only read the compiled state and the state created in _init_worker_state.
+
+        Args:
+            img:        Preprocessed RGB image
+            intrinsic:  Camera matrix
+            distortion: Distortion coefficients
+            refine:     Flag whether the pose is refined by a non-linear optimization
+
+        Returns:
+            Pose estimate with reprojection error and number of used markers
+        """
         raise NotImplementedError("Must be implemented in subclass")
 
     def adjust_offset(self, offset_mat: sm.SE3 | None) -> None:
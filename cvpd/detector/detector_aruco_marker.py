@@ -8,7 +8,8 @@ from pathlib import Path
 from camera_kit import converter
 
 # local
-from cvpd.detector.detector_abc import DetectorABC
+from cvpd.detector.helper import estimate_square_poses, reprojection_error
+from cvpd.detector.detector_abc import DetectorABC, PoseEstimate
 from cvpd.config.config_aruco_marker import ArucoMarker
 
 # typing
@@ -23,34 +24,52 @@ class ArucoMarkerDetector(DetectorABC):
         # Create configuration
         self.config_marker = ArucoMarker(**self.config_dict)
         self.config.add(self.config_marker)
-        # Set OpenCV detector up
-        self.cv_detector = cv.aruco.ArucoDetector(self.config_marker.cv_aruco_dict)
-        # Check if aruco_id is valid
-        if 0 <= self.config_marker.marker_id < self.config_marker.id_range:
-            self.aruco_id = self.config_marker.marker_id
-        else:
-            raise ValueError(f"Given id of ArUco marker '{self.config_marker.marker_id}' "
-                             f"not in valid range 0...{self.config_marker.id_range - 1}")
+        self.cv_aruco_dict = self.config_marker.cv_aruco_dict
+        # Check if aruco ids are valid
+        id_range = self.config_marker.id_range
+        for m_id in self.config_marker.marker_ids:
+            if not 0 <= m_id < id_range:
+                raise ValueError(f"Given id of ArUco marker '{m_id}' not in valid range 0...{id_range - 1}")
+        self.aruco_id = self.config_marker.marker_id
+        # Sorted ids and sizes in meter of all tracked markers
+        self.marker_ids_arr = np.array(sorted(self.config_marker.marker_ids), dtype=np.int64)
+        self.marker_sizes_m = np.array(
+            [self.config_marker.get_marker_size(m_id) for m_id in self.marker_ids_arr.tolist()], dtype=np.float64) / 1000
         # Define object points
-        ar_size_m_2 = self.config_marker.marker_size / 2 / 1000
+        ar_size_m_2 = self.config_marker.get_marker_size(self.aruco_id) / 2 / 1000
         self.obj_pts_marker = np.array([
             [-ar_size_m_2, +ar_size_m_2, 0.0],
             [+ar_size_m_2, +ar_size_m_2, 0.0],
             [+ar_size_m_2, -ar_size_m_2, 0.0],
             [-ar_size_m_2, -ar_size_m_2, 0.0],
         ], dtype=np.float_)
+        # Set OpenCV detector up
+        self._init_worker_state()
+
+    def _init_worker_state(self) -> None:
+        self.cv_detector = cv.aruco.ArucoDetector(self.cv_aruco_dict)
 
-    def _find_pose(self) -> tuple[bool, sm.SE3]:
+    def _estimate_pose(self,
+                       img: npt.NDArray[np.uint8],
+                       intrinsic: npt.NDArray[np.float64],
+                       distortion: npt.NDArray[np.float64],
+                       refine: bool = True) -> PoseEstimate:
         """ Finding the pose of a marker described object
 
+        Args:
+            img:        Preprocessed RGB image
+            intrinsic:  Camera matrix
+            distortion: Distortion coefficients
+            refine:     Flag whether the pose is refined by a non-linear optimization
+
         Returns:
-            (True if pose was found; Pose as SE(3) transformation matrix)
+            Pose estimate with reprojection error and number of used markers
         """
+        if self.config_marker.multi_id:
+            marker_poses = self._estimate_marker_poses(img, intrinsic, distortion, refine)
+            return marker_poses.get(self.config_marker.marker_id, PoseEstimate(False, sm.SE3()))
         # Initialize return variables with default values
-        found, mat = False, sm.SE3()
-        img = self.camera.get_color_frame()
-        if self.config_preproc.invert_img:
-            img = cv.bitwise_not(img)
+        estimate = PoseEstimate(False, sm.SE3())
         # get all markers on image
         found_corners, found_ids, _ = self.cv_detector.detectMarkers(img)
         # if corners are detected, check if they include the searched marker
@@ -61,38 +80,108 @@ class ArucoMarkerDetector(DetectorABC):
                 id_idx = det_id_list.index(self.config_marker.marker_id)
                 corners = found_corners[id_idx].reshape((4, 2))
                 # estimate pose for the single marker
-                found, mat = self._estimate_pose_single_marker(corners, self.obj_pts_marker)
-                if found:
-                    mat = self.config_offset.apply_offset(mat)
-        return found, mat
-
-    def _estimate_pose_single_marker(self,
-                                     marker_corners: npt.NDArray[np.float_],
-                                     marker_obj_pts: npt.NDArray[np.float_]
-                                     ) -> tuple[bool, sm.SE3]:
+                estimate = self._estimate_pose_single_marker(
+                    corners, self.obj_pts_marker, intrinsic, distortion, refine)
+                if estimate.found:
+                    estimate = estimate._replace(mat=self._apply_offsets(self.aruco_id, estimate.mat))
+        return estimate
+
+    def estimate_marker_poses(self,
+                              img: npt.NDArray[np.uint8] | None = None,
+                              intrinsic: npt.NDArray[np.float64] | None = None,
+                              distortion: npt.NDArray[np.float64] | None = None,
+                              refine: bool = True) -> dict[int, PoseEstimate]:
+        """ Estimate the poses of all configured markers in view. Missing arguments are taken from the registered camera
+
+        Args:
+            img:        RGB image. Default is the current frame of the registered camera
+            intrinsic:  Camera matrix. Default is the matrix of the registered camera
+            distortion: Distortion coefficients. Default are the coefficients of the registered camera
+            refine:     Flag whether the poses are refined by a non-linear optimization
+
+        Returns:
+            Mapping from marker id to pose estimate of all found markers
+        """
+        img, intrinsic, distortion = self._resolve_input(img, intrinsic, distortion)
+        return self._estimate_marker_poses(img, intrinsic, distortion, refine)
+
+    def _estimate_marker_poses(self,
+                               img: npt.NDArray[np.uint8],
+                               intrinsic: npt.NDArray[np.float64],
+                               distortion: npt.NDArray[np.float64],
+                               refine: bool = True) -> dict[int, PoseEstimate]:
+        marker_poses: dict[int, PoseEstimate] = {}
+        # get all markers on image
+        found_corners, found_ids, _ = self.cv_detector.detectMarkers(img)
+        if found_ids is None or len(found_corners) == 0:
+            return marker_poses
+        # Keep the first detection of each configured marker
+        uniq_ids, first_idx = np.unique(found_ids.flatten(), return_index=True)
+        is_tracked = np.isin(uniq_ids, self.marker_ids_arr)
+        det_ids, det_idx = uniq_ids[is_tracked], first_idx[is_tracked]
+        if len(det_ids) == 0:
+            return marker_poses
+        corners = np.asarray(found_corners, dtype=np.float64)[det_idx].reshape((-1, 4, 2))
+        sizes = self.marker_sizes_m[np.searchsorted(self.marker_ids_arr, det_ids)]
+        # estimate the poses of all markers in one batch
+        r_vecs, t_vecs, reproj_errs = estimate_square_poses(
+            corners, sizes, intrinsic, distortion, refine)
+        for m_id, m_corners, r_vec, t_vec, reproj_err in zip(det_ids.tolist(), corners, r_vecs, t_vecs, reproj_errs):
+            mat = self._apply_offsets(m_id, converter.cv_to_se3(r_vec.reshape((3, 1)), t_vec.reshape((3, 1))))
+            marker_poses[m_id] = PoseEstimate(True, mat, float(reproj_err), 1, m_corners)
+        return marker_poses
+
+    def _apply_offsets(self, marker_id: int, mat: sm.SE3) -> sm.SE3:
+        """ Apply the marker specific offset followed by the global offset, which stays adjustable
+
+        Args:
+            marker_id: ArUco marker id
+            mat:       Marker pose
+
+        Returns:
+            Object pose
+        """
+        marker_offset = self.config_marker.marker_offsets.get(marker_id)
+        if marker_offset is not None:
+            mat = marker_offset.apply_offset(mat)
+        return self.config_offset.apply_offset(mat)
+
+    @staticmethod
+    def _estimate_pose_single_marker(marker_corners: npt.NDArray[np.float_],
+                                     marker_obj_pts: npt.NDArray[np.float_],
+                                     intrinsic: npt.NDArray[np.float64],
+                                     distortion: npt.NDArray[np.float64],
+                                     refine: bool = True
+                                     ) -> PoseEstimate:
         """ Method to estimate the pose of a single ArUco marker.
 
         Args:
             marker_corners: The marker corner points in the image
+            marker_obj_pts: The marker corner points in the object frame
+            intrinsic:      Camera matrix
+            distortion:     Distortion coefficients
+            refine:         Flag whether the pose is refined by a non-linear optimization
 
         Returns:
-            (True if pose was found; The marker pose as SE(3) object)
+            Pose estimate of the marker
         """
         found, r_vec, t_vec = cv.solvePnP(
             marker_obj_pts,
             marker_corners,
-            self.camera.cc.intrinsic,
-            self.camera.cc.distortion,
+            intrinsic,
+            distortion,
             flags=cv.SOLVEPNP_IPPE_SQUARE
         )
-        r_vec, t_vec = cv.solvePnPRefineLM(
-            objectPoints=marker_obj_pts,
-            imagePoints=marker_corners,
-            cameraMatrix=self.camera.cc.intrinsic,
-            distCoeffs=self.camera.cc.distortion,
-            rvec=r_vec,
-            tvec=t_vec,
-            criteria=(cv.TermCriteria_EPS + cv.TermCriteria_COUNT, 30, 0.001)
-            )
+        if refine:
+            r_vec, t_vec = cv.solvePnPRefineLM(
+                objectPoints=marker_obj_pts,
+                imagePoints=marker_corners,
+                cameraMatrix=intrinsic,
+                distCoeffs=distortion,
+                rvec=r_vec,
+                tvec=t_vec,
+                criteria=(cv.TermCriteria_EPS + cv.TermCriteria_COUNT, 30, 0.001)
+                )
         mat = converter.cv_to_se3(r_vec, t_vec)
-        return found, mat
+        reproj_err = reprojection_error(marker_obj_pts, marker_corners, r_vec, t_vec, intrinsic, distortion)
+        return PoseEstimate(bool(found), mat, reproj_err, 1, marker_corners)
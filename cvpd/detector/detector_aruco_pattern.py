@@ -8,21 +8,26 @@ from pathlib import Path
 from camera_kit import converter
 
 # local
-from cvpd.detector.detector_abc import DetectorABC
-from cvpd.detector.helper import ArucoOpenCV
+from cvpd.detector.detector_abc import DetectorABC, PoseEstimate
+from cvpd.detector.helper import ArucoOpenCV, reprojection_error
 from cvpd.config.config_aruco_pattern import ArucoPattern
 
+# typing
+from numpy import typing as npt
+
 
 class ArucoPatternDetector(DetectorABC):
 
+    # Max. distance between the predicted pattern origins of one instance, relative to the marker side length
+    _cluster_tolerance = 1.5
+
     def __init__(self, config_file: str | Path):
         # Read configuration via base class
         super().__init__(config_file)
         # Create configuration
         self.config_pattern = ArucoPattern(**self.config_dict)
         self.config.add(self.config_pattern)
-        # Set OpenCV detector up
-        self.cv_detector = ArucoOpenCV(cv.aruco.ArucoDetector(self.config_pattern.cv_aruco_dict))
+        self.cv_aruco_dict = self.config_pattern.cv_aruco_dict
         # Check if aruco ids are valid
         id_range = self.config_pattern.id_range
         for m_id in self.config_pattern.marker_ids:
@@ -30,53 +35,172 @@ class ArucoPatternDetector(DetectorABC):
                 self.aruco_id = m_id
             else:
                 raise ValueError(f"Given id of ArUco marker '{m_id}' not in valid range 0...{id_range - 1}")
+        # Define object points of the marker centers
+        self.obj_pts_layout: dict[int, npt.NDArray[np.float64]] = {}
+        for m_id in self.config_pattern.marker_ids:
+            mark_pos = np.array(self.config_pattern.get_marker_position(m_id) + [0],
+                                dtype=np.float64) / 1000  # change unit to meter
+            self.obj_pts_layout[m_id] = mark_pos
+        # Set OpenCV detector up
+        self._init_worker_state()
+
+    def _init_worker_state(self) -> None:
+        self.cv_detector = ArucoOpenCV(cv.aruco.ArucoDetector(self.cv_aruco_dict))
 
-    def _find_pose(self) -> tuple[bool, sm.SE3]:
-        """ Finding the pose the pattern layout describes
+    def _estimate_pose(self,
+                       img: npt.NDArray[np.uint8],
+                       intrinsic: npt.NDArray[np.float64],
+                       distortion: npt.NDArray[np.float64],
+                       refine: bool = True) -> PoseEstimate:
+        """ Finding the pose the pattern layout describes. In multi-instance mode the closest instance is returned
+
+        Args:
+            img:        Preprocessed RGB image
+            intrinsic:  Camera matrix
+            distortion: Distortion coefficients
+            refine:     Flag whether the pose is refined by a non-linear optimization
 
         Returns:
-            (True if pose was found; Pose as SE(3) transformation matrix)
+            Pose estimate with reprojection error and number of used markers
         """
-        # Initialize return variables with default values
-        found, mat = False, sm.SE3()
-        img = self.camera.get_color_frame()
-        if self.config_preproc.invert_img:
-            img = cv.bitwise_not(img)
+        if self.config_pattern.multi_instance:
+            instances = self._estimate_instance_poses(img, intrinsic, distortion, refine)
+            if len(instances) == 0:
+                return PoseEstimate(False, sm.SE3())
+            return min(instances, key=lambda est: float(np.linalg.norm(est.mat.t)))
         # Get all markers on image
         marker_ids, marker_corners = self.cv_detector.find_group_marker_corners(
             img, list(self.config_pattern.marker_ids))
+        found_markers = {m_id: m_crs for m_id, m_crs in zip(marker_ids, marker_corners) if m_id >= 0}
+        return self._solve_pattern(found_markers, intrinsic, distortion, refine)
+
+    def estimate_instance_poses(self,
+                                img: npt.NDArray[np.uint8] | None = None,
+                                intrinsic: npt.NDArray[np.float64] | None = None,
+                                distortion: npt.NDArray[np.float64] | None = None,
+                                refine: bool = True) -> list[PoseEstimate]:
+        """ Estimate the poses of all pattern instances in view. Missing arguments are taken from the registered camera
+
+        Args:
+            img:        RGB image. Default is the current frame of the registered camera
+            intrinsic:  Camera matrix. Default is the matrix of the registered camera
+            distortion: Distortion coefficients. Default are the coefficients of the registered camera
+            refine:     Flag whether the poses are refined by a non-linear optimization
+
+        Returns:
+            Pose estimates of all found instances
+        """
+        img, intrinsic, distortion = self._resolve_input(img, intrinsic, distortion)
+        return self._estimate_instance_poses(img, intrinsic, distortion, refine)
+
+    def _estimate_instance_poses(self,
+                                 img: npt.NDArray[np.uint8],
+                                 intrinsic: npt.NDArray[np.float64],
+                                 distortion: npt.NDArray[np.float64],
+                                 refine: bool = True) -> list[PoseEstimate]:
+        # Get all markers on image including duplicated ids
+        marker_ids, marker_corners = self.cv_detector.find_all_marker_corners(
+            img, list(self.config_pattern.marker_ids))
+        instances = []
+        for found_markers in self._cluster_instances(marker_ids, marker_corners):
+            estimate = self._solve_pattern(found_markers, intrinsic, distortion, refine)
+            if estimate.found:
+                instances.append(estimate)
+        return instances
 
+    def _cluster_instances(self,
+                           marker_ids: list[int],
+                           marker_corners: list[npt.NDArray[np.float64]]
+                           ) -> list[dict[int, npt.NDArray[np.float64]]]:
+        """ Group detected markers into pattern instances. Each marker predicts the image position of the pattern
+            origin using its own image axes and the marker layout. Markers with consistent predictions form an instance.
+            The markers are assumed to be aligned with the axes of the pattern.
+
+        Args:
+            marker_ids:     Ids of all detected markers
+            marker_corners: Corners of all detected markers
+
+        Returns:
+            List of instances each mapping a marker id to its corners
+        """
+        marker_size = float(self.config_pattern.marker_size)
+        predictions = []
+        for m_id, m_crs in zip(marker_ids, marker_corners):
+            top_left, top_right, bottom_right, bottom_left = m_crs
+            # Image axes of the pattern plane in pixel per millimeter
+            x_axis = (top_right - top_left + bottom_right - bottom_left) / 2.0 / marker_size
+            y_axis = (top_left - bottom_left + top_right - bottom_right) / 2.0 / marker_size
+            pos_x, pos_y = self.config_pattern.get_marker_position(m_id)
+            origin = self.cv_detector.get_center_point(m_crs) - pos_x * x_axis - pos_y * y_axis
+            side_px = marker_size * (np.linalg.norm(x_axis) + np.linalg.norm(y_axis)) / 2.0
+            predictions.append((m_id, m_crs, origin, side_px))
+        # Assign markers greedily, starting with the biggest and therefore most reliable markers
+        predictions.sort(key=lambda pred: -pred[3])
+        clusters: list[tuple[dict[int, npt.NDArray[np.float64]], list[npt.NDArray[np.float64]]]] = []
+        for m_id, m_crs, origin, side_px in predictions:
+            best_idx, best_dist = -1, self._cluster_tolerance * side_px
+            for idx, (markers, origins) in enumerate(clusters):
+                if m_id in markers:
+                    continue
+                dist = float(np.linalg.norm(np.mean(origins, axis=0) - origin))
+                if dist < best_dist:
+                    best_idx, best_dist = idx, dist
+            if best_idx < 0:
+                clusters.append(({m_id: m_crs}, [origin]))
+            else:
+                clusters[best_idx][0][m_id] = m_crs
+                clusters[best_idx][1].append(origin)
+        return [markers for markers, _ in clusters]
+
+    def _solve_pattern(self,
+                       found_markers: dict[int, npt.NDArray[np.float64]],
+                       intrinsic: npt.NDArray[np.float64],
+                       distortion: npt.NDArray[np.float64],
+                       refine: bool = True) -> PoseEstimate:
+        """ Estimate the pattern pose from the markers of a single instance
+
+        Args:
+            found_markers: Mapping from marker id to marker corners
+            intrinsic:     Camera matrix
+            distortion:    Distortion coefficients
+            refine:        Flag whether the pose is refined by a non-linear optimization
+
+        Returns:
+            Pose estimate with reprojection error and number of used markers
+        """
+        # Initialize return variables with default values
+        estimate = PoseEstimate(False, sm.SE3())
         # Check how many markers are found:
-        found_marker_ids = set(marker_ids) & self.config_pattern.marker_ids
+        found_marker_ids = set(found_markers.keys()) & self.config_pattern.marker_ids
         if len(found_marker_ids) >= 4:
             obj_points_list = []
             img_points_list = []
             for mark_id in found_marker_ids:
-                mark_crs = marker_corners[marker_ids.index(mark_id)]
-                mark_ctr = self.cv_detector.get_center_point(mark_crs)
-                mark_pos = np.array(self.config_pattern.get_marker_position(mark_id) + [0],
-                                    dtype=np.float64) / 1000  # change unit to meter
-
+                mark_ctr = self.cv_detector.get_center_point(found_markers[mark_id])
                 img_points_list.append(mark_ctr)
-                obj_points_list.append(mark_pos)
+                obj_points_list.append(self.obj_pts_layout[mark_id])
 
             obj_points = np.array(obj_points_list)
             img_points = np.array(img_points_list)
             # found, r_vec, t_vec = cv.solveP3P(
             #     obj_points, img_points, self.camera.cc.intrinsic, self.camera.cc.distortion, flags=cv.SOLVEPNP_P3P)
             found, r_vec, t_vec = cv.solvePnP(
-                obj_points, img_points, self.camera.cc.intrinsic, self.camera.cc.distortion, flags=cv.SOLVEPNP_IPPE
+                obj_points, img_points, intrinsic, distortion, flags=cv.SOLVEPNP_IPPE
             )
-            if found:
+            if found and refine:
                 r_vec, t_vec = cv.solvePnPRefineLM(
                     objectPoints=obj_points,
                     imagePoints=img_points,
-                    cameraMatrix=self.camera.cc.intrinsic,
-                    distCoeffs=self.camera.cc.distortion,
+                    cameraMatrix=intrinsic,
+                    distCoeffs=distortion,
                     rvec=r_vec,
                     tvec=t_vec,
                     criteria=(cv.TermCriteria_EPS + cv.TermCriteria_COUNT, 30, 0.001)
                 )
+            if found:
                 mat = converter.cv_to_se3(r_vec, t_vec)
                 mat = self.config_offset.apply_offset(mat)
-        return found, mat
+                reproj_err = reprojection_error(obj_points, img_points, r_vec, t_vec, intrinsic, distortion)
+                marker_crs = np.concatenate([found_markers[mark_id] for mark_id in found_marker_ids])
+                estimate = PoseEstimate(True, mat, reproj_err, len(found_marker_ids), marker_crs)
+        return estimate
@@ -8,9 +8,13 @@ from pathlib import Path
 from camera_kit import converter
 
 # local
-from cvpd.detector.detector_abc import DetectorABC
+from cvpd.detector.helper import reprojection_error
+from cvpd.detector.detector_abc import DetectorABC, PoseEstimate
 from cvpd.config.config_charuco import Charuco
 
+# typing
+from numpy import typing as npt
+
 
 class CharucoDetector(DetectorABC):
 
@@ -21,45 +25,55 @@ class CharucoDetector(DetectorABC):
         self.config_charuco = Charuco(**self.config_dict)
         self.config.add(self.config_charuco)
         # Create OpenCV interface
+        self.cv_aruco_dict = self.config_charuco.cv_aruco_dict
         self.cv_board = cv.aruco.CharucoBoard(
             tuple(self.config_charuco.checker_grid_size),
             self.config_charuco.checker_size_m,
             self.config_charuco.marker_size_m,
-            self.config_charuco.cv_aruco_dict
+            self.cv_aruco_dict
         )
-        self.cv_detector = cv.aruco.ArucoDetector(self.config_charuco.cv_aruco_dict)
+        self._init_worker_state()
+
+    def _init_worker_state(self) -> None:
+        self.cv_detector = cv.aruco.ArucoDetector(self.cv_aruco_dict)
 
-    def _find_pose(self) -> tuple[bool, sm.SE3]:
+    def _estimate_pose(self,
+                       img: npt.NDArray[np.uint8],
+                       intrinsic: npt.NDArray[np.float64],
+                       distortion: npt.NDArray[np.float64],
+                       refine: bool = True) -> PoseEstimate:
         """ Finding the pose of the charuco board
 
+        Args:
+            img:        Preprocessed RGB image
+            intrinsic:  Camera matrix
+            distortion: Distortion coefficients
+            refine:     Flag whether the pose is refined by a non-linear optimization
+
         Returns:
-            (True if pose was found; Pose as SE(3) transformation matrix)
+            Pose estimate with reprojection error and number of used markers
         """
         # Initialize return variables with default values
-        found, mat = False, sm.SE3()
-        img = self.camera.get_color_frame()
-        if self.config_preproc.invert_img:
-            img = cv.bitwise_not(img)
-
-        # load camera matrix and distortion coefficients from camera
-        cam_intrinsic = self.camera.cc.intrinsic
-        cam_distortion = self.camera.cc.distortion
+        estimate = PoseEstimate(False, sm.SE3())
 
         marker_corners, marker_ids, _ = self.cv_detector.detectMarkers(img)
 
         if marker_ids is not None and len(marker_ids) >= 4:
             obj_p, img_p = self.cv_board.matchImagePoints(marker_corners, np.array(marker_ids))
-            found, r_vec, t_vec = cv.solvePnP(obj_p, img_p, cam_intrinsic, cam_distortion, flags=cv.SOLVEPNP_IPPE)
-            if found:
+            found, r_vec, t_vec = cv.solvePnP(obj_p, img_p, intrinsic, distortion, flags=cv.SOLVEPNP_IPPE)
+            if found and refine:
                 r_vec, t_vec = cv.solvePnPRefineLM(
                     objectPoints=obj_p,
                     imagePoints=img_p,
-                    cameraMatrix=cam_intrinsic,
-                    distCoeffs=cam_distortion,
+                    cameraMatrix=intrinsic,
+                    distCoeffs=distortion,
                     rvec=r_vec,
                     tvec=t_vec,
                     criteria=(cv.TermCriteria_EPS + cv.TermCriteria_COUNT, 30, 0.001)
                 )
+            if found:
                 mat = converter.cv_to_se3(r_vec, t_vec)
                 mat = self.config_offset.apply_offset(mat)
-        return found, mat
+                reproj_err = reprojection_error(obj_p, img_p, r_vec, t_vec, intrinsic, distortion)
+                estimate = PoseEstimate(True, mat, reproj_err, len(marker_ids), np.reshape(img_p, (-1, 2)))
+        return estimate
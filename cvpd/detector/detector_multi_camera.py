@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+# global
+import time
+import warnings
+import threading
+import spatialmath as sm
+import camera_kit as ck
+import multiprocessing as mp
+from pathlib import Path
+from multiprocessing.connection import wait
+
+# local
+from cvpd.core import factory
+from cvpd.utilities import fuse_poses
+from cvpd.detector.detector_abc import PoseEstimate
+
+# typing
+from typing import NamedTuple, Sequence
+from multiprocessing.connection import Connection
+from multiprocessing.synchronize import Event
+
+
+class CameraSetup(NamedTuple):
+    """ Description of a camera taking part in the multi-camera detection """
+    name: str                             # Camera name as used by camera_kit.camera_manager
+    coefficients: str | Path              # File with the camera calibration coefficients
+    T_base2cam: sm.SE3 = sm.SE3()         # Camera pose in the common base frame
+
+
+def _detection_worker(cam_name: str,
+                      cc_fp: str | Path,
+                      config_fp: str | Path,
+                      conn: Connection,
+                      stop_event: Event) -> None:
+    """ Detection loop of a single camera. Runs in its own process.
+
+    Args:
+        cam_name:   Camera name as used by camera_kit.camera_manager
+        cc_fp:      File with the camera calibration coefficients
+        config_fp:  Detector configuration file
+        conn:       Pipe end to send the estimates to the main process
+        stop_event: Event to stop the detection loop
+    """
+    with ck.camera_manager(cam_name) as cam:
+        cam.load_coefficients(Path(cc_fp))
+        dtt = factory.create(config_fp)
+        dtt.register_camera(cam)
+        while not stop_event.is_set():
+            t_stamp = time.time()
+            estimate = dtt.estimate_pose()
+            conn.send((estimate.found, estimate.mat.A, estimate.reproj_err, estimate.n_markers, t_stamp))
+    conn.close()
+
+
+class MultiCameraDetector:
+
+    def __init__(self,
+                 config_file: str | Path,
+                 cameras: Sequence[CameraSetup],
+                 max_age: float = 0.2,
+                 min_reproj_err: float = 0.1):
+        """ Detector running one detection process per camera and fusing the results in a common base frame
+
+        Args:
+            config_file:    Detector configuration file used for all cameras
+            cameras:        Setup of the participating cameras including their extrinsics
+            max_age:        Maximal age of a per-camera estimate in seconds to be used in the fusion
+            min_reproj_err: Lower bound of the reprojection error in pixel to limit the weight of a single estimate
+        """
+        if len(cameras) == 0:
+            raise ValueError("At least one camera is needed for the multi-camera detector.")
+        self.config_fp = Path(config_file)
+        self.cameras = list(cameras)
+        self.max_age = max_age
+        self.min_reproj_err = min_reproj_err
+        self._ctx = mp.get_context('spawn')
+        self._stop_event = self._ctx.Event()
+        self._workers: list[mp.process.BaseProcess] = []
+        self._conns: list[Connection] = []
+        # Indices of the cameras whose detection process stopped
+        self._stopped: set[int] = set()
+        # Latest estimate of each camera. Written by the reader thread and guarded by the condition
+        self._latest: list[tuple[PoseEstimate, float] | None] = [None] * len(self.cameras)
+        self._latest_cond = threading.Condition()
+        self._reader: threading.Thread | None = None
+        self._reader_stop = threading.Event()
+
+    def __enter__(self) -> MultiCameraDetector:
+        self.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.stop()
+
+    @property
+    def is_running(self) -> bool:
+        return len(self._workers) > 0
+
+    def start(self) -> None:
+        """ Start one detection process per camera and the thread collecting their estimates """
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        self._reader_stop.clear()
+        self._latest = [None] * len(self.cameras)
+        self._stopped.clear()
+        for cam in self.cameras:
+            recv_conn, send_conn = self._ctx.Pipe(duplex=False)
+            worker = self._ctx.Process(
+                target=_detection_worker,
+                args=(cam.name, cam.coefficients, self.config_fp, send_conn, self._stop_event),
+                daemon=True,
+            )
+            worker.start()
+            send_conn.close()
+            self._workers.append(worker)
+            self._conns.append(recv_conn)
+        self._reader = threading.Thread(target=self._read_estimates, name='cvpd-multi-camera-reader', daemon=True)
+        self._reader.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """ Stop all detection processes
+
+        Args:
+            timeout: Time in seconds to wait for each process before it gets terminated
+        """
+        self._stop_event.set()
+        # The reader thread keeps draining the pipes so that blocked senders can reach the stop condition
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        self._reader_stop.set()
+        if self._reader is not None:
+            self._reader.join()
+            self._reader = None
+        for conn in self._conns:
+            conn.close()
+        self._workers.clear()
+        self._conns.clear()
+
+    def _read_estimates(self) -> None:
+        """ Reader thread loop. Continuously drains the pipes and keeps the latest estimate of each camera """
+        open_conns = {conn: i for i, conn in enumerate(self._conns)}
+        while not self._reader_stop.is_set() and len(open_conns) > 0:
+            for conn in wait(list(open_conns.keys()), 0.05):
+                assert isinstance(conn, Connection)
+                try:
+                    found, mat, reproj_err, n_markers, t_stamp = conn.recv()
+                except EOFError:
+                    # Worker closed its pipe end
+                    del open_conns[conn]
+                    continue
+                estimate = PoseEstimate(found, sm.SE3(mat, check=False), reproj_err, n_markers)
+                with self._latest_cond:
+                    self._latest[open_conns[conn]] = estimate, t_stamp
+                    self._latest_cond.notify_all()
+
+    def _check_workers(self) -> None:
+        """ Exclude cameras whose detection process stopped from the fusion. Raises if no camera is left """
+        for i, (cam, worker) in enumerate(zip(self.cameras, self._workers)):
+            if i not in self._stopped and not worker.is_alive():
+                self._stopped.add(i)
+                warnings.warn(f"Detection process of camera '{cam.name}' stopped with exit code {worker.exitcode}. "
+                              f"Continue with the remaining cameras.", RuntimeWarning)
+        if len(self._stopped) == len(self._workers):
+            raise RuntimeError("Detection processes of all cameras stopped.")
+
+    def find_pose(self, timeout: float = 1.0) -> tuple[bool, sm.SE3]:
+        """ Get the fused object pose from all cameras. Waits until every running camera delivered an estimate
+            captured after this call or until the timeout expires. Afterward, all estimates not older than max_age are
+            fused. Cameras whose detection process stopped are excluded with a warning.
+
+        Args:
+            timeout: Maximal time in seconds to wait for estimates captured after this call
+
+        Returns:
+            (True if pose was found; Pose in the base frame as SE(3) transformation matrix)
+        """
+        if not self.is_running:
+            raise RuntimeError("Detector is not running. Call start() first or use it as context manager.")
+        self._check_workers()
+        t_call = time.time()
+
+        def all_updated() -> bool:
+            return all(latest is not None and latest[1] >= t_call
+                       for i, latest in enumerate(self._latest) if i not in self._stopped)
+
+        t_end = time.perf_counter() + timeout
+        with self._latest_cond:
+            while not all_updated():
+                t_left = t_end - time.perf_counter()
+                if t_left <= 0.0:
+                    break
+                # Wake up regularly to notice stopped detection processes
+                self._latest_cond.wait(min(t_left, 0.1))
+                self._check_workers()
+            latest_estimates = list(self._latest)
+        t_min = time.time() - self.max_age
+        poses, weights = [], []
+        for i, (cam, latest) in enumerate(zip(self.cameras, latest_estimates)):
+            if latest is None or i in self._stopped:
+                continue
+            estimate, t_stamp = latest
+            if estimate.found and t_stamp >= t_min and estimate.n_markers > 0:
+                poses.append(cam.T_base2cam * estimate.mat)
+                weights.append(estimate.n_markers / max(estimate.reproj_err, self.min_reproj_err) ** 2)
+        if len(poses) == 0:
+            return False, sm.SE3()
+        return True, fuse_poses(poses, weights)
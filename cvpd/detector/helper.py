@@ -5,12 +5,21 @@ import cv2 as cv
 
 # global
 import numpy as np
+from scipy.spatial.transform import Rotation as R
 
 # typing
 from typing import Sequence
 from numpy import typing as npt
 
 
+# Termination criteria of the Levenberg-Marquardt pose refinements
+_LM_CRITERIA = (cv.TermCriteria_EPS + cv.TermCriteria_COUNT, 30, 0.001)
+_LM_STEP_EPS = 1e-8
+_LM_ERR_EPS = 1e-4
+# Number of markers from which the vectorized square pose solver is faster than solving each marker with OpenCV
+SQUARE_POSES_MIN_BATCH = 24
+
+
 class ArucoOpenCV:
 
     def __init__(self, cv_aruco_detector: cv.aruco.ArucoDetector):
@@ -83,6 +92,31 @@ class ArucoOpenCV:
             ret_corners = [m_corners.reshape((4, 2)) for m_corners in found_corners]
         return ret_marker_ids, ret_corners
 
+    def find_all_marker_corners(self,
+                                img: npt.NDArray[np.uint8],
+                                marker_ids: Sequence[int] | None = None
+                                ) -> tuple[list[int], list[npt.NDArray[np.float64]]]:
+        """ Finding the corners of all markers including markers with the same id
+
+        Args:
+            img:        RGB image
+            marker_ids: List of ArUco marker ids to keep. Default is to keep all markers
+
+        Returns:
+            (List of marker ids; List of marker corners)
+        """
+        # get all markers on image
+        found_corners, found_marker_ids, _ = self.cv_detector.detectMarkers(img)
+        ret_marker_ids: list[int] = []
+        ret_corners: list[npt.NDArray[np.float64]] = []
+        if found_marker_ids is not None:
+            keep_ids = None if marker_ids is None else set(marker_ids)
+            for id_, m_corners in zip(found_marker_ids.flatten().tolist(), found_corners):
+                if keep_ids is None or id_ in keep_ids:
+                    ret_marker_ids.append(id_)
+                    ret_corners.append(m_corners.reshape((4, 2)))
+        return ret_marker_ids, ret_corners
+
     @staticmethod
     def get_center_point(marker_corners: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
         """ Helper function to determine the marker center from the corner points
@@ -97,3 +131,231 @@ class ArucoOpenCV:
         center_X = (top_left[0] + bottom_right[0]) / 2.0
         center_Y = (top_left[1] + bottom_right[1]) / 2.0
         return np.array([center_X, center_Y], dtype=np.float64)
+
+
+def reprojection_error(obj_pts: npt.NDArray[np.float64],
+                       img_pts: npt.NDArray[np.float64],
+                       r_vec: npt.NDArray[np.float64],
+                       t_vec: npt.NDArray[np.float64],
+                       intrinsic: npt.NDArray[np.float64],
+                       distortion: npt.NDArray[np.float64]) -> float:
+    """ Helper function to compute the RMS reprojection error of a pose estimate
+
+    Args:
+        obj_pts:    Object points used for the pose estimate
+        img_pts:    Corresponding image points
+        r_vec:      Estimated rotation vector
+        t_vec:      Estimated translation vector
+        intrinsic:  Camera matrix
+        distortion: Distortion coefficients
+
+    Returns:
+        RMS reprojection error in pixel
+    """
+    proj_pts, _ = cv.projectPoints(obj_pts, r_vec, t_vec, intrinsic, distortion)
+    err = proj_pts.reshape((-1, 2)) - np.reshape(img_pts, (-1, 2))
+    return float(np.sqrt(np.mean(np.sum(err ** 2, axis=1))))
+
+
+def _rot_vecs_to_mats(r_vecs: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """ Vectorized Rodrigues formula
+
+    Args:
+        r_vecs: Rotation vectors. Shape (N, 3)
+
+    Returns:
+        Rotation matrices. Shape (N, 3, 3)
+    """
+    theta = np.linalg.norm(r_vecs, axis=1)
+    small = theta < 1e-12
+    axes = r_vecs / np.where(small, 1.0, theta)[:, np.newaxis]
+    cos, sin = np.cos(theta)[:, np.newaxis, np.newaxis], np.sin(theta)[:, np.newaxis, np.newaxis]
+    skew = np.zeros((r_vecs.shape[0], 3, 3), dtype=np.float64)
+    skew[:, 0, 1], skew[:, 0, 2], skew[:, 1, 2] = -axes[:, 2], axes[:, 1], -axes[:, 0]
+    skew -= np.transpose(skew, (0, 2, 1))
+    return np.eye(3) + sin * skew + (1.0 - cos) * (skew @ skew)
+
+
+def _lm_square_poses(rot_mats: npt.NDArray[np.float64],
+                     t_vecs: npt.NDArray[np.float64],
+                     obj_pts: npt.NDArray[np.float64],
+                     img_pts: npt.NDArray[np.float64],
+                     max_iter: int
+                     ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """ Batched Levenberg-Marquardt refinement of several square poses in the normalized image plane. The rotations
+        are updated by left multiplied rotation vectors which allows a closed form Jacobian. Each pose stops
+        iterating once its step becomes negligible.
+
+    Args:
+        rot_mats: Initial rotation matrices. Shape (N, 3, 3)
+        t_vecs:   Initial translation vectors. Shape (N, 3)
+        obj_pts:  Corner points in the object frames. Shape (N, 4, 3)
+        img_pts:  Normalized image points. Shape (N, 4, 2)
+        max_iter: Maximal number of iterations
+
+    Returns:
+        (Refined rotation matrices (N, 3, 3); Refined translation vectors (N, 3))
+    """
+    rot_mats, t_vecs = rot_mats.copy(), t_vecs.copy()
+    damping = np.full(rot_mats.shape[0], 1e-3)
+    active = np.arange(rot_mats.shape[0])
+    for _ in range(max_iter):
+        if len(active) == 0:
+            break
+        n_active = len(active)
+        a_rot_mats, a_t_vecs, a_obj_pts, a_img_pts = rot_mats[active], t_vecs[active], obj_pts[active], img_pts[active]
+        rot_pts = a_obj_pts @ np.transpose(a_rot_mats, (0, 2, 1))
+        cam_pts = rot_pts + a_t_vecs[:, np.newaxis]
+        res = (cam_pts[..., :2] / cam_pts[..., 2:] - a_img_pts).reshape((n_active, 8))
+        # Jacobian of the projection: d(x, y) / dX = [[1/Z, 0, -x/Z], [0, 1/Z, -y/Z]]
+        inv_z = 1.0 / cam_pts[..., 2]
+        jac_proj = np.zeros((n_active, 4, 2, 3), dtype=np.float64)
+        jac_proj[..., 0, 0], jac_proj[..., 1, 1] = inv_z, inv_z
+        jac_proj[..., :, 2] = -cam_pts[..., :2] * inv_z[..., np.newaxis] ** 2
+        # Derivatives of the camera points: dX / dw = -[R P]x and dX / dt = I
+        jac_pts = np.zeros((n_active, 4, 3, 6), dtype=np.float64)
+        px, py, pz = rot_pts[..., 0], rot_pts[..., 1], rot_pts[..., 2]
+        jac_pts[..., 0, 1], jac_pts[..., 0, 2] = pz, -py
+        jac_pts[..., 1, 0], jac_pts[..., 1, 2] = -pz, px
+        jac_pts[..., 2, 0], jac_pts[..., 2, 1] = py, -px
+        jac_pts[..., 0, 3], jac_pts[..., 1, 4], jac_pts[..., 2, 5] = 1.0, 1.0, 1.0
+        jac = (jac_proj @ jac_pts).reshape((n_active, 8, 6))
+        jac_t = np.transpose(jac, (0, 2, 1))
+        jtj = jac_t @ jac
+        diag = np.eye(6) * (np.diagonal(jtj, axis1=1, axis2=2)[:, :, np.newaxis] + 1e-12)
+        delta = np.linalg.solve(jtj + damping[active, np.newaxis, np.newaxis] * diag,
+                                -(jac_t @ res[..., np.newaxis]))[..., 0]
+        new_rot_mats = _rot_vecs_to_mats(delta[:, :3]) @ a_rot_mats
+        new_t_vecs = a_t_vecs + delta[:, 3:]
+        new_cam_pts = a_obj_pts @ np.transpose(new_rot_mats, (0, 2, 1)) + new_t_vecs[:, np.newaxis]
+        new_res = (new_cam_pts[..., :2] / new_cam_pts[..., 2:] - a_img_pts).reshape((n_active, 8))
+        # Only accept steps that reduce the error and adapt the damping accordingly
+        sq_err, new_sq_err = np.sum(res ** 2, axis=1), np.sum(new_res ** 2, axis=1)
+        improved = new_sq_err < sq_err
+        rot_mats[active[improved]], t_vecs[active[improved]] = new_rot_mats[improved], new_t_vecs[improved]
+        damping[active] = np.where(improved, damping[active] / 10.0, damping[active] * 10.0)
+        # Poses with negligible steps or error reductions are converged
+        converged = ((np.linalg.norm(delta, axis=1) <= _LM_STEP_EPS * np.linalg.norm(a_t_vecs, axis=1))
+                     | (improved & (sq_err - new_sq_err <= _LM_ERR_EPS * sq_err)))
+        active = active[~converged]
+    return rot_mats, t_vecs
+
+
+def estimate_square_poses(marker_corners: npt.NDArray[np.float64],
+                          marker_sizes: npt.NDArray[np.float64],
+                          intrinsic: npt.NDArray[np.float64],
+                          distortion: npt.NDArray[np.float64],
+                          refine: bool = True,
+                          min_batch_size: int = SQUARE_POSES_MIN_BATCH
+                          ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """ Pose estimation of several square markers. Batches with at least min_batch_size markers are solved vectorized:
+        Both IPPE solutions are computed from the closed form square-to-quad homographies and the solution with
+        the smaller error is refined with a batched Levenberg-Marquardt optimization. Smaller batches are
+        solved marker by marker with OpenCV, which is faster due to the lower overhead.
+
+    Args:
+        marker_corners: Corner points in the image ordered like the ArUco corners. Shape (N, 4, 2)
+        marker_sizes:   Side lengths of the markers in meter. Shape (N,)
+        intrinsic:      Camera matrix
+        distortion:     Distortion coefficients
+        refine:         Flag whether the poses are refined by a non-linear optimization
+        min_batch_size: Minimal number of markers to use the vectorized solver
+
+    Returns:
+        (Rotation vectors (N, 3); Translation vectors (N, 3); RMS reprojection errors in pixel (N,))
+    """
+    n_markers = marker_corners.shape[0]
+    sizes = np.asarray(marker_sizes, dtype=np.float64)
+    # Object points of all markers
+    half = sizes[:, np.newaxis] / 2.0
+    zeros = np.zeros_like(half)
+    obj_pts = np.stack([
+        np.concatenate([-half, +half, zeros], axis=1),
+        np.concatenate([+half, +half, zeros], axis=1),
+        np.concatenate([+half, -half, zeros], axis=1),
+        np.concatenate([-half, -half, zeros], axis=1),
+    ], axis=1)
+    if n_markers < min_batch_size:
+        r_vecs = np.empty((n_markers, 3), dtype=np.float64)
+        t_vecs = np.empty((n_markers, 3), dtype=np.float64)
+        reproj_errs = np.empty(n_markers, dtype=np.float64)
+        for i, (m_obj_pts, m_corners) in enumerate(zip(obj_pts, np.asarray(marker_corners, dtype=np.float64))):
+            _, r_vec, t_vec = cv.solvePnP(m_obj_pts, m_corners, intrinsic, distortion, flags=cv.SOLVEPNP_IPPE_SQUARE)
+            if refine:
+                r_vec, t_vec = cv.solvePnPRefineLM(m_obj_pts, m_corners, intrinsic, distortion, r_vec, t_vec,
+                                                   criteria=_LM_CRITERIA)
+            r_vecs[i], t_vecs[i] = r_vec.ravel(), t_vec.ravel()
+            reproj_errs[i] = reprojection_error(m_obj_pts, m_corners, r_vec, t_vec, intrinsic, distortion)
+        return r_vecs, t_vecs, reproj_errs
+    # Normalized image coordinates of all corners in one call
+    img_pts = cv.undistortPoints(
+        np.reshape(marker_corners, (-1, 1, 2)).astype(np.float64), intrinsic, distortion).reshape((n_markers, 4, 2))
+    x, y = img_pts[..., 0], img_pts[..., 1]
+    # Homographies from the unit square to the marker quads
+    sx = x[:, 0] - x[:, 1] + x[:, 2] - x[:, 3]
+    sy = y[:, 0] - y[:, 1] + y[:, 2] - y[:, 3]
+    dx1, dx2 = x[:, 1] - x[:, 2], x[:, 3] - x[:, 2]
+    dy1, dy2 = y[:, 1] - y[:, 2], y[:, 3] - y[:, 2]
+    den = dx1 * dy2 - dx2 * dy1
+    g = (sx * dy2 - dx2 * sy) / den
+    h = (dx1 * sy - sx * dy1) / den
+    hom_sq = np.empty((n_markers, 3, 3), dtype=np.float64)
+    hom_sq[:, 0] = np.stack([x[:, 1] - x[:, 0] + g * x[:, 1], x[:, 3] - x[:, 0] + h * x[:, 3], x[:, 0]], axis=1)
+    hom_sq[:, 1] = np.stack([y[:, 1] - y[:, 0] + g * y[:, 1], y[:, 3] - y[:, 0] + h * y[:, 3], y[:, 0]], axis=1)
+    hom_sq[:, 2] = np.stack([g, h, np.ones(n_markers)], axis=1)
+    # Map from the marker plane to the unit square. The top left corner is at (-s/2, s/2)
+    obj2sq = np.zeros((n_markers, 3, 3), dtype=np.float64)
+    obj2sq[:, 0, 0], obj2sq[:, 0, 2] = 1.0 / sizes, 0.5
+    obj2sq[:, 1, 1], obj2sq[:, 1, 2] = -1.0 / sizes, 0.5
+    obj2sq[:, 2, 2] = 1.0
+    hom = hom_sq @ obj2sq
+    hom = hom / hom[:, 2:, 2:]
+    # IPPE: Jacobian of the homographies at the marker centers
+    p, q = hom[:, 0, 2], hom[:, 1, 2]
+    jac_hom = hom[:, :2, :2] - hom[:, 2:, :2] * np.stack([p, q], axis=1)[:, :, np.newaxis]
+    # Rotations of the z-axis onto the lines of sight through the marker centers
+    los = np.stack([p, q, np.ones(n_markers)], axis=1)
+    los /= np.linalg.norm(los, axis=1, keepdims=True)
+    ax, ay, az = los[:, 0], los[:, 1], los[:, 2]
+    d = 1.0 / (1.0 + az)
+    rot_los = np.stack([
+        np.stack([1.0 - ax * ax * d, -ax * ay * d, ax], axis=1),
+        np.stack([-ax * ay * d, 1.0 - ay * ay * d, ay], axis=1),
+        np.stack([-ax, -ay, 1.0 - (ax * ax + ay * ay) * d], axis=1),
+    ], axis=1)
+    b_mat = rot_los[:, :2, :2] - np.stack([p, q], axis=1)[:, :, np.newaxis] * rot_los[:, 2:, :2]
+    a_mat = np.linalg.solve(b_mat, jac_hom)
+    r_tilde = a_mat / np.linalg.norm(a_mat, ord=2, axis=(1, 2))[:, np.newaxis, np.newaxis]
+    b0 = np.sqrt(np.clip(1.0 - r_tilde[:, 0, 0] ** 2 - r_tilde[:, 1, 0] ** 2, 0.0, None))
+    b1 = np.sqrt(np.clip(1.0 - r_tilde[:, 0, 1] ** 2 - r_tilde[:, 1, 1] ** 2, 0.0, None))
+    b1 *= np.where(r_tilde[:, 0, 0] * r_tilde[:, 0, 1] + r_tilde[:, 1, 0] * r_tilde[:, 1, 1] > 0.0, -1.0, 1.0)
+    # Both solutions of the planar pose ambiguity with their least squares translations
+    rot_list, t_list = [], []
+    for sign in (1.0, -1.0):
+        col0 = np.einsum('nij,nj->ni', rot_los, np.stack([r_tilde[:, 0, 0], r_tilde[:, 1, 0], sign * b0], axis=1))
+        col1 = np.einsum('nij,nj->ni', rot_los, np.stack([r_tilde[:, 0, 1], r_tilde[:, 1, 1], sign * b1], axis=1))
+        rot_mats = np.stack([col0, col1, np.cross(col0, col1)], axis=2)
+        rot_pts = np.einsum('nij,nkj->nki', rot_mats, obj_pts)
+        # x * (r3 P + tz) = r1 P + tx and y * (r3 P + tz) = r2 P + ty
+        lhs = np.zeros((n_markers, 4, 2, 3), dtype=np.float64)
+        lhs[:, :, 0, 0], lhs[:, :, 1, 1] = 1.0, 1.0
+        lhs[:, :, :, 2] = -img_pts
+        rhs = img_pts * rot_pts[:, :, 2:] - rot_pts[:, :, :2]
+        lhs, rhs = lhs.reshape((n_markers, 8, 3)), rhs.reshape((n_markers, 8, 1))
+        lhs_t = np.transpose(lhs, (0, 2, 1))
+        rot_list.append(rot_mats)
+        t_list.append(np.linalg.solve(lhs_t @ lhs, lhs_t @ rhs)[..., 0])
+    cand_rot_mats, cand_t_vecs = np.stack(rot_list), np.stack(t_list)
+    # Keep the solution with the smaller error like OpenCV's IPPE and refine it
+    cand_pts = obj_pts @ np.transpose(cand_rot_mats, (0, 1, 3, 2)) + cand_t_vecs[:, :, np.newaxis]
+    cand_sq_err = np.sum((cand_pts[..., :2] / cand_pts[..., 2:] - img_pts) ** 2, axis=(2, 3))
+    best = np.argmin(cand_sq_err, axis=0)
+    rot_mats, t_vecs = cand_rot_mats[best, np.arange(n_markers)], cand_t_vecs[best, np.arange(n_markers)]
+    if refine:
+        rot_mats, t_vecs = _lm_square_poses(rot_mats, t_vecs, obj_pts, img_pts, _LM_CRITERIA[1])
+    # Exact pixel errors including the distortion by projecting all corners in one call
+    cam_pts = obj_pts @ np.transpose(rot_mats, (0, 2, 1)) + t_vecs[:, np.newaxis]
+    proj_pts, _ = cv.projectPoints(cam_pts.reshape((-1, 1, 3)), np.zeros(3), np.zeros(3), intrinsic, distortion)
+    err = proj_pts.reshape((n_markers, 4, 2)) - np.reshape(marker_corners, (n_markers, 4, 2))
+    reproj_errs = np.sqrt(np.mean(np.sum(err ** 2, axis=2), axis=1))
+    return R.from_matrix(rot_mats).as_rotvec(), t_vecs, reproj_errs
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+# global
+import enum
+import cv2 as cv
+import numpy as np
+import spatialmath as sm
+from time import perf_counter
+
+# local
+from cvpd.detector.detector_abc import DetectorABC, PoseEstimate
+
+# typing
+from typing import NamedTuple
+from numpy import typing as npt
+
+
+class Strategy(enum.Enum):
+    """ Detection strategies ordered from the most to the least accurate one """
+    FULL = 'full'              # Full frame with pose refinement
+    ROI = 'roi'                # Region of interest around the last found pose with pose refinement
+    NO_REFINE = 'no_refine'    # Full frame without pose refinement
+    DOWNSCALE = 'downscale'    # Downscaled full frame with pose refinement
+
+
+class ScheduledEstimate(NamedTuple):
+    """ Pose estimate together with the scheduling information of the frame """
+    estimate: PoseEstimate
+    strategy: Strategy
+    duration: float            # Detection time in seconds
+    deadline_missed: bool
+
+
+class LatencyScheduler:
+
+    # Maximal factor by which the probe interval of a strategy grows after probes exceeding the budget
+    _max_probe_backoff = 8
+
+    def __init__(self,
+                 detector: DetectorABC,
+                 budget: float,
+                 roi_margin: float = 0.5,
+                 downscale: float = 0.5,
+                 smoothing: float = 0.2,
+                 n_sigma: float = 2.0,
+                 probe_interval: int | None = 30):
+        """ Scheduler picking the most accurate detection strategy that fits into a per-frame latency budget
+
+        Args:
+            detector:   Detector used for all strategies
+            budget:     Latency budget per frame in seconds
+            roi_margin: Margin around the last found image points relative to their bounding box size
+            downscale:  Image scaling factor of the downscaled strategy
+            smoothing:  Smoothing factor of the running cost estimates in the range (0, 1]
+            n_sigma:    Number of mean absolute deviations added to the mean cost of a strategy
+            probe_interval: Number of frames after which the cost estimate of a strategy that was not run expires
+                            and the strategy is probed again. The interval doubles after each probe exceeding the
+                            budget. None disables probing and keeps stale estimates forever
+        """
+        if budget <= 0.0:
+            raise ValueError(f"Latency budget has to be positive. Got {budget}")
+        if not 0.0 < downscale < 1.0:
+            raise ValueError(f"Downscale factor has to be in the range (0, 1). Got {downscale}")
+        if not 0.0 < smoothing <= 1.0:
+            raise ValueError(f"Smoothing factor has to be in the range (0, 1]. Got {smoothing}")
+        if probe_interval is not None and probe_interval < 1:
+            raise ValueError(f"Probe interval has to be at least one frame. Got {probe_interval}")
+        self.detector = detector
+        self.budget = budget
+        self.roi_margin = roi_margin
+        self.downscale = downscale
+        self.smoothing = smoothing
+        self.n_sigma = n_sigma
+        self.probe_interval = probe_interval
+        self.n_frames = 0
+        self.n_missed = 0
+        self._cost_mean: dict[Strategy, float] = {}
+        self._cost_dev: dict[Strategy, float] = {}
+        self._last_run: dict[Strategy, int] = {}
+        self._probe_wait: dict[Strategy, int] = {}
+        self._last_img_pts: npt.NDArray[np.float64] | None = None
+
+    def reset(self) -> None:
+        """ Forget the cost estimates, the tracked target and the statistics """
+        self.n_frames = 0
+        self.n_missed = 0
+        self._cost_mean.clear()
+        self._cost_dev.clear()
+        self._last_run.clear()
+        self._probe_wait.clear()
+        self._last_img_pts = None
+
+    @property
+    def is_tracking(self) -> bool:
+        return self._last_img_pts is not None
+
+    def cost_estimate(self, strategy: Strategy) -> float | None:
+        """ Get the conservative cost estimate of a strategy
+
+        Args:
+            strategy: Detection strategy
+
+        Returns:
+            Estimated cost in seconds or None if the strategy was not executed yet
+        """
+        mean = self._cost_mean.get(strategy)
+        if mean is None:
+            return None
+        return mean + self.n_sigma * self._cost_dev[strategy]
+
+    def is_stale(self, strategy: Strategy) -> bool:
+        """ Check whether the cost estimate of a strategy expired because the strategy was not run for its
+            current probe interval
+
+        Args:
+            strategy: Detection strategy
+
+        Returns:
+            True if the strategy is due for a probe
+        """
+        if self.probe_interval is None or strategy not in self._last_run:
+            return False
+        return self.n_frames - self._last_run[strategy] >= self._probe_wait[strategy]
+
+    def select_strategy(self) -> Strategy:
+        """ Select the most accurate strategy whose estimated cost fits into the budget. Strategies without or
+            with a stale cost estimate are tried. If no strategy fits the cheapest one is used.
+
+        Returns:
+            Selected detection strategy
+        """
+        candidates = [s for s in Strategy if s is not Strategy.ROI or self.is_tracking]
+        costs = {}
+        for strategy in candidates:
+            cost = self.cost_estimate(strategy)
+            if cost is None or cost <= self.budget or self.is_stale(strategy):
+                return strategy
+            costs[strategy] = cost
+        return min(costs, key=lambda s: costs[s])
+
+    def find_pose(self) -> tuple[bool, sm.SE3]:
+        """ Get the object pose from the current camera frame within the latency budget
+
+        Returns:
+            (True if pose was found; Pose as SE(3) transformation matrix)
+        """
+        scheduled = self.estimate_pose()
+        return scheduled.estimate.found, scheduled.estimate.mat
+
+    def estimate_pose(self,
+                      img: npt.NDArray[np.uint8] | None = None,
+                      intrinsic: npt.NDArray[np.float64] | None = None,
+                      distortion: npt.NDArray[np.float64] | None = None) -> ScheduledEstimate:
+        """ Estimate the object pose with the strategy selected for this frame.
+            Missing arguments are taken from the camera registered at the detector.
+
+        Args:
+            img:        RGB image. Default is the current frame of the registered camera
+            intrinsic:  Camera matrix. Default is the matrix of the registered camera
+            distortion: Distortion coefficients. Default are the coefficients of the registered camera
+
+        Returns:
+            Pose estimate with the used strategy, the detection time and whether the deadline was missed
+        """
+        img, intrinsic, distortion = self.detector._resolve_input(img, intrinsic, distortion)
+        strategy = self.select_strategy()
+        t_start = perf_counter()
+        estimate = self._run_strategy(strategy, img, intrinsic, distortion)
+        duration = perf_counter() - t_start
+        # Update statistics and tracking state
+        self._update_cost(strategy, duration)
+        self._last_img_pts = estimate.img_pts if estimate.found else None
+        deadline_missed = duration > self.budget
+        self.n_frames += 1
+        self.n_missed += int(deadline_missed)
+        return ScheduledEstimate(estimate, strategy, duration, deadline_missed)
+
+    def _update_cost(self, strategy: Strategy, duration: float) -> None:
+        mean = self._cost_mean.get(strategy)
+        if mean is None or self.is_stale(strategy):
+            # Expired estimates are replaced since the scene may have changed completely
+            self._cost_mean[strategy] = duration
+            self._cost_dev[strategy] = 0.0
+            # Back off probes of strategies which still exceed the budget
+            if self.probe_interval is not None:
+                if mean is None or duration <= self.budget:
+                    self._probe_wait[strategy] = self.probe_interval
+                else:
+                    self._probe_wait[strategy] = min(
+                        2 * self._probe_wait[strategy], self._max_probe_backoff * self.probe_interval)
+        else:
+            self._cost_mean[strategy] = mean + self.smoothing * (duration - mean)
+            self._cost_dev[strategy] += self.smoothing * (abs(duration - mean) - self._cost_dev[strategy])
+        self._last_run[strategy] = self.n_frames
+
+    def _run_strategy(self,
+                      strategy: Strategy,
+                      img: npt.NDArray[np.uint8],
+                      intrinsic: npt.NDArray[np.float64],
+                      distortion: npt.NDArray[np.float64]) -> PoseEstimate:
+        """ Run the detector with the given strategy on a preprocessed image. Image points of the result are given in
+            full frame pixels
+        """
+        if strategy is Strategy.FULL:
+            return self.detector._estimate_pose(img, intrinsic, distortion)
+        elif strategy is Strategy.NO_REFINE:
+            return self.detector._estimate_pose(img, intrinsic, distortion, refine=False)
+        elif strategy is Strategy.ROI:
+            x0, y0, x1, y1 = self._roi(img.shape[1], img.shape[0])
+            roi_intrinsic = np.array(intrinsic, dtype=np.float64)
+            roi_intrinsic[0, 2] -= x0
+            roi_intrinsic[1, 2] -= y0
+            estimate = self.detector._estimate_pose(img[y0:y1, x0:x1], roi_intrinsic, distortion)
+            if estimate.img_pts is not None:
+                estimate = estimate._replace(img_pts=estimate.img_pts + np.array([x0, y0], dtype=np.float64))
+            return estimate
+        elif strategy is Strategy.DOWNSCALE:
+            scaled_img = cv.resize(img, None, fx=self.downscale, fy=self.downscale, interpolation=cv.INTER_AREA)
+            scaled_intrinsic = np.array(intrinsic, dtype=np.float64)
+            scaled_intrinsic[:2, :2] *= self.downscale
+            # Pixel centers of the resized image: c' = (c + 0.5) * s - 0.5
+            scaled_intrinsic[:2, 2] = (scaled_intrinsic[:2, 2] + 0.5) * self.downscale - 0.5
+            estimate = self.detector._estimate_pose(scaled_img, scaled_intrinsic, distortion)
+            if estimate.img_pts is not None:
+                estimate = estimate._replace(img_pts=(estimate.img_pts + 0.5) / self.downscale - 0.5)
+            return estimate
+        else:
+            raise ValueError(f"Unknown detection strategy: {strategy}")
+
+    def _roi(self, width: int, height: int) -> tuple[int, int, int, int]:
+        """ Region of interest around the last found image points
+
+        Args:
+            width:  Image width
+            height: Image height
+
+        Returns:
+            (Left; Top; Right; Bottom) pixel borders of the region
+        """
+        assert self._last_img_pts is not None
+        (x_min, y_min), (x_max, y_max) = self._last_img_pts.min(axis=0), self._last_img_pts.max(axis=0)
+        margin_x = self.roi_margin * (x_max - x_min)
+        margin_y = self.roi_margin * (y_max - y_min)
+        x0 = int(np.clip(np.floor(x_min - margin_x), 0, width - 1))
+        y0 = int(np.clip(np.floor(y_min - margin_y), 0, height - 1))
+        x1 = int(np.clip(np.ceil(x_max + margin_x), x0 + 1, width))
+        y1 = int(np.clip(np.ceil(y_max + margin_y), y0 + 1, height))
+        return x0, y0, x1, y1
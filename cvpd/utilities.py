@@ -1,11 +1,12 @@
 from __future__ import annotations
 import yaml
 import numpy as np
+import spatialmath as sm
 from pathlib import Path
 from scipy.spatial.transform import Rotation as R
 
 # typing
-from typing import Any
+from typing import Any, Sequence
 from numpy import typing as npt
 
 
@@ -23,6 +24,27 @@ def rotate_rot_vec(r_vec: npt.NDArray[np.float_], axis: str = 'x', ang: float =
     return np.reshape((R.from_rotvec(np.squeeze(r_vec)) * R.from_rotvec(r_vec23)).as_rotvec(), [3, 1])
 
 
+def fuse_poses(poses: Sequence[sm.SE3], weights: Sequence[float]) -> sm.SE3:
+    """ Helper function to fuse several estimates of the same pose
+
+    Args:
+        poses:   Pose estimates given in a common frame
+        weights: Non-negative weight of each estimate
+
+    Returns:
+        Weighted mean pose
+    """
+    if len(poses) == 0 or len(poses) != len(weights):
+        raise ValueError(f"Need the same non-zero number of poses and weights. Got {len(poses)} and {len(weights)}")
+    w = np.array(weights, dtype=np.float64)
+    if np.any(w < 0.0) or np.sum(w) <= 0.0:
+        raise ValueError(f"Weights must be non-negative and not all zero. Got {w.tolist()}")
+    w = w / np.sum(w)
+    t_mean = np.sum([w_ * np.asarray(p.t) for w_, p in zip(w, poses)], axis=0)
+    rot_mean = R.from_matrix(np.array([p.R for p in poses])).mean(weights=w)
+    return sm.SE3.Rt(rot_mean.as_matrix(), t_mean)
+
+
 def load_yaml(file_path: Path) -> dict[str, Any]:
     with file_path.open("r") as filestream:
         try:
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+# global
+import pytest
+import cv2 as cv
+import numpy as np
+from pathlib import Path
+
+# local
+from cvpd.detector.detector_aruco_pattern import ArucoPatternDetector
+
+# typing
+from numpy import typing as npt
+
+
+_config_fp = Path(__file__).parents[1].joinpath('demos', 'dtt_config', 'aruco_pattern_battery_station.yaml')
+_intrinsic = np.array([[900.0, 0.0, 640.0], [0.0, 900.0, 360.0], [0.0, 0.0, 1.0]])
+_distortion = np.zeros(5)
+_img = np.zeros((720, 1280, 3), dtype=np.uint8)
+# Pattern instances as (rotation vector; translation vector) pairs, 0.14 - 0.2 m apart and tilted up to 0.8 rad
+_instance_poses = [
+    (np.array([0.0, 0.8, 0.0]), np.array([-0.1, 0.0, 0.6])),
+    (np.array([0.3, -0.2, 0.1]), np.array([0.08, 0.03, 0.65])),
+    (np.array([-0.5, 0.0, 0.3]), np.array([0.0, -0.14, 0.7])),
+]
+
+
+def _project_instance(dtt: ArucoPatternDetector,
+                      r_vec: npt.NDArray[np.float64],
+                      t_vec: npt.NDArray[np.float64]) -> dict[int, npt.NDArray[np.float64]]:
+    """ Project the marker corners of a pattern instance into the image
+
+    Returns:
+        Mapping from marker id to marker corners
+    """
+    half = dtt.config_pattern.marker_size / 2.0
+    markers = {}
+    for m_id in sorted(dtt.config_pattern.marker_ids):
+        pos_x, pos_y = dtt.config_pattern.get_marker_position(m_id)
+        obj_pts = np.array([
+            [pos_x - half, pos_y + half, 0.0],
+            [pos_x + half, pos_y + half, 0.0],
+            [pos_x + half, pos_y - half, 0.0],
+            [pos_x - half, pos_y - half, 0.0],
+        ]) / 1000
+        img_pts, _ = cv.projectPoints(obj_pts, r_vec, t_vec, _intrinsic, _distortion)
+        markers[m_id] = img_pts.reshape((4, 2))
+    return markers
+
+
+@pytest.fixture
+def dtt() -> ArucoPatternDetector:
+    return ArucoPatternDetector(_config_fp)
+
+
+def test_cluster_instances_separates_instances_with_duplicate_ids(dtt: ArucoPatternDetector) -> None:
+    instances = [_project_instance(dtt, r_vec, t_vec) for r_vec, t_vec in _instance_poses]
+    detections = [(m_id, m_crs, i) for i, markers in enumerate(instances) for m_id, m_crs in markers.items()]
+    # Detection order of the markers must not matter
+    order = np.random.default_rng(3).permutation(len(detections))
+    detections = [detections[i] for i in order]
+    clusters = dtt._cluster_instances([d[0] for d in detections], [d[1] for d in detections])
+    assert len(clusters) == len(instances)
+    for cluster in clusters:
+        # All markers of a cluster belong to the same instance
+        owners = {i for m_id, m_crs in cluster.items() for i, markers in enumerate(instances) if markers[m_id] is m_crs}
+        assert len(owners) == 1
+        assert len(cluster) == len(instances[owners.pop()])
+
+
+def test_instances_with_less_than_four_markers_are_dropped(dtt: ArucoPatternDetector,
+                                                           monkeypatch: pytest.MonkeyPatch) -> None:
+    complete = _project_instance(dtt, *_instance_poses[0])
+    partial = _project_instance(dtt, *_instance_poses[1])
+    del partial[22]
+    marker_ids = list(complete.keys()) + list(partial.keys())
+    marker_corners = list(complete.values()) + list(partial.values())
+    monkeypatch.setattr(dtt.cv_detector, 'find_all_marker_corners', lambda img, ids: (marker_ids, marker_corners))
+    estimates = dtt.estimate_instance_poses(_img, _intrinsic, _distortion)
+    assert len(estimates) == 1
+    assert estimates[0].n_markers == 4
+    # Marker centers are approximated from the corners, which is not exact under perspective
+    np.testing.assert_allclose(estimates[0].mat.t, _instance_poses[0][1], atol=1e-3)
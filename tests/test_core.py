@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+# global
+import pytest
+import cv2 as cv
+import numpy as np
+from pathlib import Path
+
+# local
+from cvpd.core import DetectorPool, factory
+
+# typing
+from numpy import typing as npt
+
+
+_config_dir = Path(__file__).parents[1].joinpath('demos', 'dtt_config')
+_intrinsic = np.array([[600.0, 0.0, 320.0], [0.0, 600.0, 240.0], [0.0, 0.0, 1.0]])
+_distortion = np.array([0.05, -0.02, 0.0, 0.0, 0.0])
+
+
+def _render_frames(marker_ids: list[int], n_frames: int, seed: int = 0) -> list[npt.NDArray[np.uint8]]:
+    """ Render frames with perspectively distorted ArUco markers at random positions """
+    rng = np.random.default_rng(seed)
+    aruco_dict = cv.aruco.getPredefinedDictionary(cv.aruco.DICT_4X4_100)
+    frames = []
+    for _ in range(n_frames):
+        frame = np.full((480, 640), 200, dtype=np.uint8)
+        for i, m_id in enumerate(marker_ids):
+            marker = cv.copyMakeBorder(cv.aruco.generateImageMarker(aruco_dict, m_id, 60), 10, 10, 10, 10,
+                                       cv.BORDER_CONSTANT, value=255)
+            side = rng.uniform(60.0, 100.0)
+            top_left = np.array([20.0 + 120.0 * i, rng.uniform(20.0, 360.0)])
+            dst = top_left + np.array([[0.0, 0.0], [side, 0.0], [side, side], [0.0, side]]) + rng.normal(0.0, 5.0, (4, 2))
+            src = np.array([[0.0, 0.0], [80.0, 0.0], [80.0, 80.0], [0.0, 80.0]])
+            hom = cv.getPerspectiveTransform(src.astype(np.float32), dst.astype(np.float32))
+            warped = cv.warpPerspective(marker, hom, (640, 480), flags=cv.INTER_LINEAR, borderValue=0)
+            mask = cv.warpPerspective(np.ones_like(marker), hom, (640, 480), flags=cv.INTER_NEAREST)
+            frame[mask > 0] = warped[mask > 0]
+        frames.append(cv.cvtColor(frame, cv.COLOR_GRAY2RGB))
+    return frames
+
+
+@pytest.mark.parametrize('config_name, marker_ids', [
+    ('aruco_marker_bat_socket_ccs.yaml', [13]),
+    ('aruco_marker_tool_rack.yaml', [31, 32, 33, 34, 35]),
+])
+def test_pool_matches_serial_estimates(config_name: str, marker_ids: list[int]) -> None:
+    config_fp = _config_dir.joinpath(config_name)
+    frames = _render_frames(marker_ids, n_frames=64)
+    dtt = factory.create(config_fp)
+    serial = [dtt.estimate_pose(frame, _intrinsic, _distortion) for frame in frames]
+    assert sum(estimate.found for estimate in serial) > 48
+    with DetectorPool(config_fp, n_workers=8) as pool:
+        pooled = pool.map(frames, _intrinsic, _distortion)
+    for est_serial, est_pooled in zip(serial, pooled):
+        assert est_pooled.found == est_serial.found
+        assert est_pooled.n_markers == est_serial.n_markers
+        assert est_pooled.reproj_err == est_serial.reproj_err
+        np.testing.assert_array_equal(est_pooled.mat.A, est_serial.mat.A)
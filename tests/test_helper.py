@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+# global
+import pytest
+import cv2 as cv
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+# local
+from cvpd.detector.helper import estimate_square_poses, reprojection_error
+
+# typing
+from numpy import typing as npt
+
+
+_intrinsic = np.array([[900.0, 0.0, 640.0], [0.0, 910.0, 360.0], [0.0, 0.0, 1.0]])
+_distortion = np.array([0.1, -0.05, 0.001, 0.002, 0.0])
+_lm_criteria = (cv.TermCriteria_EPS + cv.TermCriteria_COUNT, 30, 0.001)
+# OpenCV 4 stops at a relative step of 1e-3, so the reference of the batched solver is fully converged
+_lm_criteria_converged = (cv.TermCriteria_EPS + cv.TermCriteria_COUNT, 200, 1e-12)
+
+
+def _square_obj_pts(marker_size: float) -> npt.NDArray[np.float64]:
+    half = marker_size / 2.0
+    return np.array([[-half, half, 0.0], [half, half, 0.0], [half, -half, 0.0], [-half, -half, 0.0]])
+
+
+def _random_markers(n_markers: int, noise_px: float, seed: int = 42
+                    ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """ Project squares with mixed sizes and random poses into the image
+
+    Returns:
+        (Marker corners (N, 4, 2); Marker sizes in meter (N,))
+    """
+    rng = np.random.default_rng(seed)
+    sizes = rng.uniform(0.02, 0.08, n_markers)
+    corners = []
+    for size in sizes:
+        r_vec = rng.normal(0.0, 0.5, 3)
+        t_vec = np.array([rng.uniform(-0.2, 0.2), rng.uniform(-0.1, 0.1), rng.uniform(0.3, 1.2)])
+        img_pts, _ = cv.projectPoints(_square_obj_pts(size), r_vec, t_vec, _intrinsic, _distortion)
+        corners.append(img_pts.reshape((4, 2)) + rng.normal(0.0, noise_px, (4, 2)))
+    return np.array(corners), sizes
+
+
+def _opencv_pose(corners: npt.NDArray[np.float64],
+                 size: float,
+                 refine: bool,
+                 criteria: tuple[int, int, float] = _lm_criteria
+                 ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    obj_pts = _square_obj_pts(size)
+    _, r_vec, t_vec = cv.solvePnP(obj_pts, corners, _intrinsic, _distortion, flags=cv.SOLVEPNP_IPPE_SQUARE)
+    if refine:
+        r_vec, t_vec = cv.solvePnPRefineLM(obj_pts, corners, _intrinsic, _distortion, r_vec, t_vec,
+                                           criteria=criteria)
+    return r_vec.ravel(), t_vec.ravel()
+
+
+def _rot_angle(r_vec_1: npt.NDArray[np.float64], r_vec_2: npt.NDArray[np.float64]) -> float:
+    return float((R.from_rotvec(r_vec_1).inv() * R.from_rotvec(r_vec_2)).magnitude())
+
+
+def test_square_poses_without_noise_match_ground_truth() -> None:
+    rng = np.random.default_rng(7)
+    sizes = np.array([0.02, 0.05, 0.08])
+    r_vecs = rng.normal(0.0, 0.5, (3, 3))
+    t_vecs = np.array([[0.1, 0.05, 0.5], [-0.15, 0.0, 0.8], [0.0, -0.08, 1.1]])
+    corners = np.array([
+        cv.projectPoints(_square_obj_pts(s), r, t, _intrinsic, _distortion)[0].reshape((4, 2))
+        for s, r, t in zip(sizes, r_vecs, t_vecs)
+    ])
+    est_r_vecs, est_t_vecs, reproj_errs = estimate_square_poses(
+        corners, sizes, _intrinsic, _distortion, min_batch_size=1)
+    for r_vec, est_r_vec in zip(r_vecs, est_r_vecs):
+        assert _rot_angle(r_vec, est_r_vec) < 1e-6
+    np.testing.assert_allclose(est_t_vecs, t_vecs, atol=1e-6)
+    np.testing.assert_allclose(reproj_errs, 0.0, atol=1e-3)
+
+
+def test_square_poses_without_refinement_match_opencv_ippe() -> None:
+    corners, sizes = _random_markers(200, noise_px=0.2)
+    r_vecs, t_vecs, _ = estimate_square_poses(
+        corners, sizes, _intrinsic, _distortion, refine=False, min_batch_size=1)
+    for m_corners, size, r_vec, t_vec in zip(corners, sizes, r_vecs, t_vecs):
+        cv_r_vec, cv_t_vec = _opencv_pose(m_corners, size, refine=False)
+        assert _rot_angle(r_vec, cv_r_vec) < 1e-8
+        np.testing.assert_allclose(t_vec, cv_t_vec, atol=1e-8)
+
+
+def test_square_poses_with_refinement_match_opencv_lm() -> None:
+    corners, sizes = _random_markers(200, noise_px=0.2)
+    r_vecs, t_vecs, reproj_errs = estimate_square_poses(corners, sizes, _intrinsic, _distortion, min_batch_size=1)
+    angles = []
+    for m_corners, size, r_vec, t_vec, reproj_err in zip(corners, sizes, r_vecs, t_vecs, reproj_errs):
+        cv_r_vec, cv_t_vec = _opencv_pose(m_corners, size, refine=True, criteria=_lm_criteria_converged)
+        angles.append(_rot_angle(r_vec, cv_r_vec))
+        obj_pts = _square_obj_pts(size)
+        exact_err = reprojection_error(obj_pts, m_corners, r_vec, t_vec, _intrinsic, _distortion)
+        cv_err = reprojection_error(obj_pts, m_corners, cv_r_vec, cv_t_vec, _intrinsic, _distortion)
+        # Ill-conditioned markers may converge to a different pose, but never to a worse fit
+        assert exact_err <= cv_err + 0.01
+        assert reproj_err == pytest.approx(exact_err, abs=1e-9)
+    assert np.median(angles) < 1e-4
+
+
+def test_square_poses_of_small_batches_match_opencv_lm() -> None:
+    corners, sizes = _random_markers(5, noise_px=0.2)
+    r_vecs, t_vecs, reproj_errs = estimate_square_poses(corners, sizes, _intrinsic, _distortion)
+    for m_corners, size, r_vec, t_vec, reproj_err in zip(corners, sizes, r_vecs, t_vecs, reproj_errs):
+        cv_r_vec, cv_t_vec = _opencv_pose(m_corners, size, refine=True)
+        np.testing.assert_allclose(r_vec, cv_r_vec, atol=1e-12)
+        np.testing.assert_allclose(t_vec, cv_t_vec, atol=1e-12)
+        obj_pts = _square_obj_pts(size)
+        assert reproj_err == reprojection_error(obj_pts, m_corners, r_vec, t_vec, _intrinsic, _distortion)
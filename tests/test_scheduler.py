@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+# global
+import pytest
+import numpy as np
+import spatialmath as sm
+
+# local
+import cvpd.scheduler
+from cvpd.scheduler import LatencyScheduler, Strategy
+from cvpd.detector.detector_abc import PoseEstimate
+
+# typing
+from typing import Callable
+from numpy import typing as npt
+
+
+_img = np.zeros((480, 640, 3), dtype=np.uint8)
+_intrinsic = np.array([[600.0, 0.0, 320.0], [0.0, 600.0, 240.0], [0.0, 0.0, 1.0]])
+_distortion = np.zeros(5)
+
+
+class _FakeClock:
+
+    def __init__(self) -> None:
+        self.t = 0.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+class _FakeDetector:
+    """ Detector advancing a fake clock by an injected duration instead of detecting anything """
+
+    def __init__(self, clock: _FakeClock, full_duration: Callable[[int], float], other_duration: float = 0.005):
+        self.clock = clock
+        self.full_duration = full_duration
+        self.other_duration = other_duration
+        self.n_full = 0
+
+    def _resolve_input(self,
+                       img: npt.NDArray[np.uint8],
+                       intrinsic: npt.NDArray[np.float64],
+                       distortion: npt.NDArray[np.float64]
+                       ) -> tuple[npt.NDArray[np.uint8], npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        return img, intrinsic, distortion
+
+    def _estimate_pose(self,
+                       img: npt.NDArray[np.uint8],
+                       intrinsic: npt.NDArray[np.float64],
+                       distortion: npt.NDArray[np.float64],
+                       refine: bool = True) -> PoseEstimate:
+        if img.shape == _img.shape and refine:
+            self.clock.t += self.full_duration(self.n_full)
+            self.n_full += 1
+        else:
+            self.clock.t += self.other_duration
+        img_pts = np.array([[100.0, 100.0], [140.0, 100.0], [140.0, 140.0], [100.0, 140.0]])
+        return PoseEstimate(True, sm.SE3(), 0.1, 1, img_pts)
+
+
+def _run(monkeypatch: pytest.MonkeyPatch, full_duration: Callable[[int], float], n_frames: int
+         ) -> tuple[LatencyScheduler, list[Strategy]]:
+    clock = _FakeClock()
+    monkeypatch.setattr(cvpd.scheduler, 'perf_counter', clock)
+    scheduler = LatencyScheduler(_FakeDetector(clock, full_duration), budget=0.03, probe_interval=5)  # type: ignore
+    strategies = [scheduler.estimate_pose(_img, _intrinsic, _distortion).strategy for _ in range(n_frames)]
+    return scheduler, strategies
+
+
+def test_slow_first_frame_does_not_lock_out_full_strategy(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Warm-up makes the first full frame detection slow
+    scheduler, strategies = _run(monkeypatch, lambda i: 0.06 if i == 0 else 0.005, n_frames=40)
+    assert strategies == [Strategy.FULL] + 4 * [Strategy.ROI] + 35 * [Strategy.FULL]
+    assert scheduler.n_missed == 1
+
+
+def test_probes_of_expensive_strategy_back_off(monkeypatch: pytest.MonkeyPatch) -> None:
+    scheduler, strategies = _run(monkeypatch, lambda i: 0.06, n_frames=150)
+    full_frames = [i for i, strategy in enumerate(strategies) if strategy is Strategy.FULL]
+    # Probe intervals double from 5 frames up to 8 times the interval
+    assert full_frames == [0, 5, 15, 35, 75, 115]
+    assert scheduler.n_missed == len(full_frames)
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+# global
+import pytest
+import numpy as np
+import spatialmath as sm
+
+# local
+from cvpd.utilities import fuse_poses
+
+
+def test_fuse_poses_weights_translations() -> None:
+    poses = [sm.SE3.Trans(0.0, 0.0, 0.0), sm.SE3.Trans(1.0, 2.0, 3.0)]
+    fused = fuse_poses(poses, [1.0, 3.0])
+    np.testing.assert_allclose(fused.t, [0.75, 1.5, 2.25])
+    np.testing.assert_allclose(fused.R, np.eye(3), atol=1e-12)
+
+
+def test_fuse_poses_averages_rotations() -> None:
+    poses = [sm.SE3.Rz(0.1) * sm.SE3.Rx(0.3), sm.SE3.Rz(0.5) * sm.SE3.Rx(0.3)]
+    fused = fuse_poses(poses, [2.0, 2.0])
+    np.testing.assert_allclose(fused.A, (sm.SE3.Rz(0.3) * sm.SE3.Rx(0.3)).A, atol=1e-12)
+
+
+def test_fuse_poses_ignores_zero_weights() -> None:
+    pose = sm.SE3.Rt(sm.SO3.RPY(0.2, -0.4, 1.0).R, [0.1, -0.2, 0.8])
+    fused = fuse_poses([pose, sm.SE3.Trans(5.0, 5.0, 5.0) * sm.SE3.Ry(1.0)], [0.7, 0.0])
+    np.testing.assert_allclose(fused.A, pose.A, atol=1e-12)
+
+
+@pytest.mark.parametrize('poses, weights', [
+    ([], []),
+    ([sm.SE3()], [1.0, 1.0]),
+    ([sm.SE3(), sm.SE3()], [1.0, -1.0]),
+    ([sm.SE3(), sm.SE3()], [0.0, 0.0]),
+])
+def test_fuse_poses_rejects_invalid_weights(poses: list[sm.SE3], weights: list[float]) -> None:
+    with pytest.raises(ValueError):
+        fuse_poses(poses, weights)